@@ -6,42 +6,45 @@ from fuse import FuseOSError
 
 logger = logging.getLogger(__name__)
 
+def _raise_erofs(self, *args, **kwargs):
+    raise FuseOSError(EROFS)
+
+def _raise_eperm(self, *args, **kwargs):
+    raise FuseOSError(EPERM)
+
+_READONLY_NOOPS = {Filesystem: _raise_erofs, Node: _raise_eperm}
+_WRITEONLY_NOOPS = {Filesystem: _raise_eperm, Node: _raise_eperm}
+
+def _find_noop(node_class, noops):
+    for base_class, noop in noops.items():
+        if issubclass(node_class, base_class):
+            return noop
+    return None
+
 def readonly(node_class):
-    noop = None
-    if issubclass(node_class, Filesystem):
-        def noop(self, *args, **kwargs):
-            raise FuseOSError(EROFS)
-    elif issubclass(node_class, Node):
-        def noop(self, *args, **kwargs):
-            raise FuseOSError(EPERM)
-    else:
+    noop = _find_noop(node_class, _READONLY_NOOPS)
+    if noop is None:
         logger.warning("@readonly decorator on an incompatiple class: %s", node_class)
         return node_class
 
     member_to_noop = ('chmod', 'chown', 'create', 'mkdir', 'removexattr', 'rename', 'rmdir', 'setxattr', 'symlink', 'truncate', 'unlink', 'utimes', 'write')
 
-    for member in dir(node_class):
-        if callable(getattr(node_class, member)) and member in member_to_noop:
+    for member in member_to_noop:
+        if hasattr(node_class, member):
             setattr(node_class, member, noop)
 
     return node_class
 
 def writeonly(node_class):
-    noop = None
-    if issubclass(node_class, Filesystem):
-        def noop(self, *args, **kwargs):
-            raise FuseOSError(EPERM)
-    elif issubclass(node_class, Node):
-        def noop(self, *args, **kwargs):
-            raise FuseOSError(EPERM)
-    else:
+    noop = _find_noop(node_class, _WRITEONLY_NOOPS)
+    if noop is None:
         logger.warning("@writeonly decorator on an incompatiple class: %s", node_class)
         return node_class
 
     member_to_noop = ('chmod', 'chown', 'read', 'readdir')
 
-    for member in dir(node_class):
-        if callable(getattr(node_class, member)) and member in member_to_noop:
+    for member in member_to_noop:
+        if hasattr(node_class, member):
             setattr(node_class, member, noop)
 
-    return node_class
\ No newline at end of file
+    return node_class
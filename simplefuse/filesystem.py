@@ -1,7 +1,10 @@
 import os
 import logging
 
+from collections import OrderedDict, deque
+from threading import Lock
 from time import time
+from types import MappingProxyType
 from stat import S_IFDIR, S_IFLNK, S_IFREG
 from errno import EPERM, ENOENT, ENODATA
 from fuse import FUSE, FuseOSError, Operations
@@ -11,25 +14,43 @@ ENOATTR = ENODATA
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of resolved paths kept by Filesystem's node cache
+NODE_CACHE_SIZE = 1024
+
+# Maximum number of unlinked nodes kept for reuse, per node class
+NODE_POOL_SIZE = 1024
+
+# Owner of new nodes, looked up once at import instead of for every node
+_UID = os.getuid()
+_GID = os.getgid()
+
+_STATFS = MappingProxyType(dict(f_bsize=512, f_blocks=4096, f_bavail=2048))
+
 class Node:
-    def __init__(self):
-        now = time()
+    __slots__ = ('attr',)
 
-        attr = dict()
-        attr['st_mode'] = 0o655 | S_IFREG
-        attr['st_uid'] = os.getuid()
-        attr['st_gid'] = os.getgid()
-        attr['st_nlink'] = 1
-        attr['st_size'] = 0
-        attr['st_ctime'] = now
-        attr['st_mtime'] = now
-        attr['st_atime'] = now
+    _ATTR_TEMPLATE = dict(
+        st_mode=0o655 | S_IFREG,
+        st_uid=_UID,
+        st_gid=_GID,
+        st_nlink=1,
+        st_size=0,
+    )
+
+    def __init__(self):
+        attr = Node._ATTR_TEMPLATE.copy()
+        attr['st_ctime'] = attr['st_mtime'] = attr['st_atime'] = time()
         self.attr = attr
 
+    def reset(self):
+        attr = self.attr
+        attr.clear()
+        attr.update(Node._ATTR_TEMPLATE)
+
     def chown(self, uid, gid):
         self.attr['st_uid'] = uid
         self.attr['st_gid'] = gid
-        self.set_ctime()
+        self.set_ctime(time())
 
     def getattr(self, fh=None):
         return self.attr
@@ -50,30 +71,40 @@ class Node:
         self.attr[name] = value
 
     def utimes(self, times=None):
-        now = time()
-        atime, mtime = times if times else (now, now)
+        if times:
+            atime, mtime = times
+        else:
+            atime = mtime = time()
 
         self.attr['st_atime'] = atime
         self.attr['st_mtime'] = mtime
 
-    def set_ctime(self, ctime=time()):
+    def set_ctime(self, ctime):
         self.attr['st_ctime'] = ctime
     
-    def set_mtime(self, mtime=time()):
+    def set_mtime(self, mtime):
         self.attr['st_ctime'] = mtime
         self.attr['st_mtime'] = mtime
 
-    def set_atime(self, atime=time()):
+    def set_atime(self, atime):
         self.attr['st_atime'] = atime
 
 
 class Directory(Node):
+    __slots__ = ('fd', 'children')
+
     def __init__(self):
         super().__init__()
         self.attr['st_mode'] = (0o755 | S_IFDIR)
         self.fd = 0
         self.children = dict()
 
+    def reset(self):
+        super().reset()
+        self.attr['st_mode'] = (0o755 | S_IFDIR)
+        self.fd = 0
+        self.children.clear()
+
     def get_child(self, name):
         return self.children[name]
 
@@ -90,68 +121,77 @@ class Directory(Node):
 
     def chmod(self, mode):
         self.attr['st_mode'] = mode | S_IFDIR
-        self.set_ctime()
+        self.set_ctime(time())
 
     def create(self, name, mode):
-        node = File()
+        node = _acquire_node(File)
         node.attr['st_mode'] = mode | S_IFREG
         self.add_child(name, node)
         self.fd += 1
-        self.set_ctime()
+        # Reuse the new node's creation time rather than reading the clock again
+        self.set_ctime(node.attr['st_ctime'])
         return self.fd
 
     def mkdir(self, name, mode):
-        node = Directory()
+        node = _acquire_node(Directory)
         self.attr['st_mode'] = mode | S_IFDIR
         self.add_child(name, node)
 
         self.attr['st_nlink'] += 1
-        self.set_mtime()
+        self.set_mtime(node.attr['st_ctime'])
 
     def readdir(self, fh):
-        yield '.'
-        yield '..'
-        for directory in self.children.keys():
-            yield directory
-        self.set_atime()
+        self.set_atime(time())
+        return ['.', '..', *self.children.keys()]
 
     def rename(self, old_name, new_name, new_parent_node):
         node = self.remove_child(old_name)
         new_parent_node.add_child(new_name, node)
-        self.set_mtime()
-        new_parent_node.set_mtime()
-        node.set_ctime()
+        now = time()
+        self.set_mtime(now)
+        new_parent_node.set_mtime(now)
+        node.set_ctime(now)
 
     def rmdir(self, name):
-        self.remove_child(name)
+        node = self.remove_child(name)
 
         self.attr['st_nlink'] -= 1
-        self.set_mtime()
+        self.set_mtime(time())
+        return node
 
     def symlink(self, name, target):
         node = Symlink(target)
         self.add_child(name, node)
-        self.set_mtime()
+        self.set_mtime(time())
 
     def unlink(self, name):
-        self.remove_child(name)
-        self.set_mtime()
+        node = self.remove_child(name)
+        self.set_mtime(time())
+        return node
 
 
 class File(Node):
+    __slots__ = ('fd', 'content')
+
     def __init__(self, content=b''):
         super().__init__()
         self.attr['st_mode'] = (0o755 | S_IFREG)
         self.fd = 0
         self.set_content(content)
 
+    def reset(self):
+        super().reset()
+        self.attr['st_mode'] = (0o755 | S_IFREG)
+        self.fd = 0
+        self.content.clear()
+
     def set_content(self, content):
-        self.content = content
+        self.content = bytearray(content)
         self.attr['st_size'] = len(content)
 
     def chmod(self, mode):
         self.attr['st_mode'] = mode | S_IFREG
-        self.set_ctime()
+        self.set_ctime(time())
     
     def flush(self, fid):
         pass
@@ -161,33 +201,74 @@ class File(Node):
         return self.fd
 
     def read(self, length, offset, fh):
-        self.set_atime()
-        return self.content[offset:offset+length]
+        self.set_atime(time())
+        # fusepy copies the result with create_string_buffer, which only accepts bytes.
+        # Don't slice through a memoryview: while it is exported the bytearray can't
+        # be resized, which would make a concurrent write or truncate fail.
+        return bytes(self.content[offset:offset+length])
 
     def write(self, buffer, offset):
-        self.content = self.content[:offset] + buffer
+        if offset > len(self.content):
+            self.content.extend(bytes(offset - len(self.content)))
+        self.content[offset:offset+len(buffer)] = buffer
         self.attr['st_size'] = len(self.content)
-        self.set_mtime()
+        self.set_mtime(time())
 
     def truncate(self, length):
-        self.content = self.content[:length]
-        self.set_mtime()
+        if length > len(self.content):
+            self.content.extend(bytes(length - len(self.content)))
+        del self.content[length:]
+        self.attr['st_size'] = len(self.content)
+        self.set_mtime(time())
 
 
 class Symlink(Node):
+    __slots__ = ('target',)
+
     def __init__(self, target):
         super().__init__()
         self.attr['st_mode'] = (0o755 | S_IFLNK)
         self.target = target
 
     def readlink(self):
-        self.set_atime()
+        self.set_atime(time())
         return self.target
 
+# Free lists of unlinked nodes. Only the exact classes are pooled, so
+# user-defined subclasses are always constructed normally. Nodes are only
+# released by Filesystem while it holds its lock, once they are no longer
+# reachable from its tree or node cache. Don't keep references to nodes
+# that may be unlinked through a mounted Filesystem.
+_FREE_NODES = {
+    File: deque(maxlen=NODE_POOL_SIZE),
+    Directory: deque(maxlen=NODE_POOL_SIZE),
+}
+
+def _acquire_node(node_class):
+    try:
+        node = _FREE_NODES[node_class].pop()
+    except (KeyError, IndexError):
+        return node_class()
+
+    attr = node.attr
+    attr['st_ctime'] = attr['st_mtime'] = attr['st_atime'] = time()
+    return node
+
+def _release_node(node):
+    free_nodes = _FREE_NODES.get(type(node))
+    if free_nodes is not None:
+        node.reset()
+        free_nodes.append(node)
+
+
 class Filesystem(Operations):
-    def __init__(self, root_node=Directory(), mount_point=None):
-        self.root_node = root_node
+    def __init__(self, root_node=None, mount_point=None):
+        self.root_node = root_node if root_node is not None else Directory()
         self.fd = 0
+        self.node_cache = OrderedDict()
+        self.lock = Lock()
+        # Checked once, so configure logging before creating the filesystem
+        self.debug_enabled = logger.isEnabledFor(logging.DEBUG)
 
         if mount_point is not None:
             self.fuse = self.mount(mount_point)
@@ -196,161 +277,218 @@ class Filesystem(Operations):
         self.fuse = FUSE(self, mount_point, foreground=True)
         return self.fuse
 
+    def __call__(self, op, *args):
+        # fusepy runs callbacks on several threads. Path lookups fill the node
+        # cache and mutations invalidate it, so run one callback at a time.
+        with self.lock:
+            return super().__call__(op, *args)
+
     def chmod(self, path, mode):
-        logger.debug("chmod %s", path)
+        if self.debug_enabled:
+            logger.debug("chmod %s", path)
 
         node = self.__get_node(path)
         node.chmod(mode)
         return 0
 
     def chown(self, path, uid, gid):
-        logger.debug("chown %s", path)
+        if self.debug_enabled:
+            logger.debug("chown %s", path)
 
         node = self.__get_node(path)
         node.chown(uid, gid)
 
     def create(self, path, mode):
-        logger.debug("create %s", path)
+        if self.debug_enabled:
+            logger.debug("create %s", path)
 
-        parent_path, name = os.path.split(path)
-        node = self.__get_node(parent_path)
+        node, name = self.__split_parent(path)
+        self.node_cache.pop(path, None)
         return node.create(name, mode)
 
     def flush(self, path, fid):
-        logger.debug("flush %s", path)
+        if self.debug_enabled:
+            logger.debug("flush %s", path)
 
         node = self.__get_node(path)
         return node.flush(fid)
 
     def getattr(self, path, fh=None):
-        logger.debug("getattr %s", path)
+        if self.debug_enabled:
+            logger.debug("getattr %s", path)
 
         node = self.__get_node(path)
         return node.getattr(fh)
 
     def getxattr(self, path, name, position=0):
-        logger.debug("getxattr %s", path)
+        if self.debug_enabled:
+            logger.debug("getxattr %s", path)
 
         node = self.__get_node(path)
         return node.getxattr(name, position)
 
     def listxattr(self, path):
-        logger.debug("listxattr %s", path)
+        if self.debug_enabled:
+            logger.debug("listxattr %s", path)
 
         node = self.__get_node(path)
         return node.attr.keys()
 
     def mkdir(self, path, mode):
-        logger.debug("mkdir %s", path)
+        if self.debug_enabled:
+            logger.debug("mkdir %s", path)
 
-        parent_path, name = os.path.split(path)
-        node = self.__get_node(parent_path)
+        node, name = self.__split_parent(path)
+        self.node_cache.pop(path, None)
         node.mkdir(name, mode)
 
     def open(self, path, flags):
-        logger.debug("open %s", path)
+        if self.debug_enabled:
+            logger.debug("open %s", path)
         node = self.__get_node(path)
         return node.open(flags)
 
     def read(self, path, size, offset, fh):
-        logger.debug("read %s", path)
+        if self.debug_enabled:
+            logger.debug("read %s", path)
 
         node = self.__get_node(path)
         return node.read(size, offset, fh)
 
     def readdir(self, path, fh):
         node = self.__get_node(path)
-        logger.debug("readdir %s", path)
+        if self.debug_enabled:
+            logger.debug("readdir %s", path)
 
         return node.readdir(fh)
 
     def readlink(self, path):
         node = self.__get_node(path)
-        logger.debug("readlink %s", path)
+        if self.debug_enabled:
+            logger.debug("readlink %s", path)
 
         return node.readlink()
 
     def removexattr(self, path, name):
-        logger.debug("removexattr %s", path)
+        if self.debug_enabled:
+            logger.debug("removexattr %s", path)
 
         node = self.__get_node(path)
         node.removexattr(name)
 
     def rename(self, old, new):
-        logger.debug("rename %s %s", old, new)
+        if self.debug_enabled:
+            logger.debug("rename %s %s", old, new)
 
-        old_parent_path, old_name = os.path.split(old)
-        new_parent_path, new_name = os.path.split(new)
-        old_parent_node = self.__get_node(old_parent_path)
-        new_parent_node = self.__get_node(new_parent_path)
+        old_parent_node, old_name = self.__split_parent(old)
+        new_parent_node, new_name = self.__split_parent(new)
 
+        moved = self.__forget(old)
+        self.__forget(new)
         old_parent_node.rename(old_name, new_name, new_parent_node)
 
+        for old_path, node in moved:
+            self.node_cache[new + old_path[len(old):]] = node
+
     def rmdir(self, path):
-        logger.debug("rmdir %s", path)
+        if self.debug_enabled:
+            logger.debug("rmdir %s", path)
 
-        parent_path, name = os.path.split(path)
-        node = self.__get_node(parent_path)
-        node.rmdir(name)
+        node, name = self.__split_parent(path)
+        self.__forget(path)
+        _release_node(node.rmdir(name))
 
     def setxattr(self, path, name, value, options, position=0):
-        logger.debug("setxattr %s", path)
+        if self.debug_enabled:
+            logger.debug("setxattr %s", path)
 
         node = self.__get_node(path)
         node.setxattr(name, value, options, position)
 
     def statfs(self, path):
-        logger.debug("statfs %s", path)
+        if self.debug_enabled:
+            logger.debug("statfs %s", path)
 
-        return dict(f_bsize=512, f_blocks=4096, f_bavail=2048)
+        return _STATFS
 
     def symlink(self, source, target):
-        logger.debug("symlink %s %s", source, target)
+        if self.debug_enabled:
+            logger.debug("symlink %s %s", source, target)
 
-        parent_path, name = os.path.split(source)
-        node = self.__get_node(parent_path)
+        node, name = self.__split_parent(source)
+        self.node_cache.pop(source, None)
         node.symlink(name, target)
 
     def truncate(self, path, length, fh=None):
-        logger.debug("truncate %s", path)
+        if self.debug_enabled:
+            logger.debug("truncate %s", path)
 
         node = self.__get_node(path)
         node.truncate(length)
 
     def unlink(self, path):
-        logger.debug("unlink %s", path)
+        if self.debug_enabled:
+            logger.debug("unlink %s", path)
 
-        parent_path, name = os.path.split(path)
-        node = self.__get_node(parent_path)
-        node.unlink(name)
+        node, name = self.__split_parent(path)
+        self.node_cache.pop(path, None)
+        _release_node(node.unlink(name))
 
     def utimes(self, path, times=None):
-        logger.debug("utimes %s", path)
+        if self.debug_enabled:
+            logger.debug("utimes %s", path)
 
         node = self.__get_node(path)
         node.utime(times)
 
     def write(self, path, buffer, offset, fh):
-        logger.debug("write %s", path)
+        if self.debug_enabled:
+            logger.debug("write %s", path)
 
         node = self.__get_node(path)
         node.write(buffer, offset)
         return len(buffer)
 
     def __get_node(self, path):
+        try:
+            node = self.node_cache[path]
+            self.node_cache.move_to_end(path)
+            return node
+        except KeyError:
+            pass
+
         node = self.root_node
         try:
-            for name in path.split(os.sep):
-                if name != '':
+            # fuse paths are always absolute and '/' separated
+            for name in path.split('/'):
+                if name:
                     try:
-                        node = node.get_child(name)
+                        node = node.children[name]
                     except KeyError:
+                        # Only subclasses overriding readdir can populate children lazily
+                        if type(node).readdir is Directory.readdir:
+                            raise
                         node.readdir(None)
-                        node = node.get_child(name)
+                        node = node.children[name]
         except AttributeError:
             raise FuseOSError(EPERM)
         except KeyError:
             raise FuseOSError(ENOENT)
 
+        self.node_cache[path] = node
+        if len(self.node_cache) > NODE_CACHE_SIZE:
+            self.node_cache.popitem(last=False)
         return node
 
+    def __split_parent(self, path):
+        i = path.rfind('/')
+        return self.__get_node(path[:i] or '/'), path[i+1:]
+
+    def __forget(self, path):
+        # Drop path and everything below it from the node cache
+        prefix = path + '/'
+        forgotten = []
+        for cached_path in list(self.node_cache):
+            if cached_path == path or cached_path.startswith(prefix):
+                forgotten.append((cached_path, self.node_cache.pop(cached_path)))
+        return forgotten
@@ -3,18 +3,24 @@ from simplefuse.decorators import readonly
 
 @readonly
 class DictDirectory(Directory):
-    def __init__(self, data={}):
+    def __init__(self, data=None):
         super().__init__()
-        self.data = data
+        data = data if data is not None else {}
+
+        # Build the tree iteratively so deeply nested dicts don't hit the recursion limit
+        stack = [(self, data)]
+        while stack:
+            directory, items = stack.pop()
+            for name, value in items.items():
+                if isinstance(value, dict):
+                    child = DictDirectory()
+                    directory.add_child(name, child)
+                    stack.append((child, value))
+                elif isinstance(value, str):
+                    directory.add_child(name, File(value.encode()))
+                elif isinstance(value, bytes):
+                    directory.add_child(name, File(value))
 
-        for name, value in data.items():
-            if isinstance(value, dict):
-                dir = DictDirectory(value)
-                self.add_child(name, dir)
-            elif isinstance(value, str):
-                file = File(bytes(value, 'utf8'))
-                self.add_child(name, file)
-    
     def get_dict(self):
         # TODO
         pass